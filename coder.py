@@ -1,7 +1,9 @@
 from archytas.agent import Agent, no_spinner, Role, Message
 from chat_window import run_chat_window, register_chat_callback, register_history_callback, ChatMessage
+from program_index import ProgramIndex, ProjectIndex
 import argparse
 from easyrepl import readl
+import difflib
 import json
 import os
 import dirtyjson
@@ -12,6 +14,7 @@ import pdb
 
 
 CONTEXT_PREFIX = 'Context: The current program is:\n'
+UPDATE_CONTEXT_PREFIX = 'Context: The program was updated.\n'
 
 role_map = {
     Role.user: 'You',
@@ -24,8 +27,29 @@ class Edit(TypedDict):
     start: int
     end: int
 
+class SymbolEdit(TypedDict, total=False):
+    code: str
+    path: str     # (project mode) file to edit, relative to the project root
+    replace: str  # qualified name of a class/function to replace
+    before: str   # qualified name of a class/function to insert the code before
+    after: str    # qualified name of a class/function to insert the code after
+
+SYMBOL_EDIT_KEYS = ('replace', 'before', 'after')
+
+
+def is_symbol_edit(edit:Edit|SymbolEdit) -> bool:
+    """Return True if the edit targets a symbol rather than a line range"""
+    return any(key in edit for key in SYMBOL_EDIT_KEYS)
+
+
+def validate_edit_block(block:dict) -> None:
+    """Check that a parsed json block is either a line-range edit or a symbol edit"""
+    n_targets = sum(key in block for key in SYMBOL_EDIT_KEYS)
+    is_line_edit = 'start' in block and 'end' in block
+    assert 'code' in block and (is_line_edit or n_targets == 1) and not (is_line_edit and n_targets), f"INTERNAL ERROR: Expected json block to have keys 'code' and either 'start' and 'end', or one of {SYMBOL_EDIT_KEYS}, but found {block}"
+
 
-def json_block_iter(message:str) -> Generator[str|Edit, None, None]:
+def json_block_iter(message:str) -> Generator[str|Edit|SymbolEdit, None, None]:
     """
     Iterator to extract text and json objects from the LLM message.
     """
@@ -66,10 +90,10 @@ def json_block_iter(message:str) -> Generator[str|Edit, None, None]:
         # yield the block if single block, or sequentially yield each item in the list of blocks
         if isinstance(parsed_block, list):
             for item in parsed_block:
-                assert 'code' in item and 'start' in item and 'end' in item, f"INTERNAL ERROR: Expected json block to have keys 'code', 'start', and 'end', but found {parsed_block}"
+                validate_edit_block(item)
                 yield dict(item)
         elif isinstance(parsed_block, dict):
-            assert 'code' in parsed_block and 'start' in parsed_block and 'end' in parsed_block, f"INTERNAL ERROR: Expected json block to have keys 'code', 'start', and 'end', but found {parsed_block}"
+            validate_edit_block(parsed_block)
             yield dict(parsed_block)
         else:
             raise ValueError(f"INTERNAL ERROR: Expected json block to be a dict or list, but found {parsed_block}")
@@ -82,7 +106,16 @@ def json_block_iter(message:str) -> Generator[str|Edit, None, None]:
 
 
 
-def parse_program(message:str) -> tuple[list[Edit], str]:
+def edit_location(edit:Edit|SymbolEdit) -> str:
+    """Describe where an edit applies, e.g. `[3, 7)` or `utils.py: replace ProgramManager.update_program`"""
+    path = f"{edit['path']}: " if 'path' in edit else ''
+    for key in SYMBOL_EDIT_KEYS:
+        if key in edit:
+            return f"{path}{key} {edit[key]}"
+    return f"{path}[{edit['start']}, {edit['end']})"
+
+
+def parse_program(message:str) -> tuple[list[Edit|SymbolEdit], str]:
     """
     Extract all code edits from a message.
 
@@ -91,6 +124,10 @@ def parse_program(message:str) -> tuple[list[Edit], str]:
     - code: the code to be inserted
     - start: the start index of the code to be replaced
     - end: the end index of the code to be replaced
+    Alternatively, symbol edits keep `code`, but replace `start` and `end` with exactly one of the following keys:
+    - replace: the qualified name of a class/function to replace
+    - before: the qualified name of a class/function to insert the code before
+    - after: the qualified name of a class/function to insert the code after
 
     Args:
         message: the message to parse from the LLM. Should contain json blocks wrapped in ```json and ending with ```.
@@ -104,17 +141,36 @@ def parse_program(message:str) -> tuple[list[Edit], str]:
     edits = [b for b in chunks if isinstance(b, dict)]
 
     # convert the chunks into a chat message format: [start, end)\n{code}
-    chat_chunks = [f'[{c["start"]}, {c["end"]})\n<code>{c["code"]}</code>' if isinstance(c, dict) else c.strip() for c in chunks]
+    chat_chunks = [f'{edit_location(c)}\n<code>{c["code"]}</code>' if isinstance(c, dict) else c.strip() for c in chunks]
     chat = '\n\n'.join(chat_chunks)
 
     return edits, chat
 
 
-def add_line_numbers(program:str) -> str:
-    """Add line numbers to a program. Line numbers start at 1"""
+def add_line_numbers(program:str, omit:list[tuple[int, int]]|None=None) -> str:
+    """
+    Add line numbers to a program. Line numbers start at 1
+
+    Args:
+        program (str): the program to add line numbers to
+        omit (list[tuple[int, int]], optional): sorted, non-overlapping [start, end) line spans to collapse into a single placeholder line. Defaults to None.
+    """
     lines = program.splitlines(keepends=True)
     width = len(str(len(lines)))
-    return ''.join([f"{i+1:>{width}}| {line}" for i, line in enumerate(lines)])
+    omitted = {start: end for start, end in omit or []}
+    numbered = []
+    i = 1
+    while i <= len(lines):
+        if i in omitted:
+            end = omitted[i]
+            indent = lines[i-1][:len(lines[i-1]) - len(lines[i-1].lstrip())]
+            span = f"line {i}" if end - i == 1 else f"lines {i}-{end-1}"
+            numbered.append(f"{'':>{width}}| {indent}... # {span} omitted\n")
+            i = end
+            continue
+        numbered.append(f"{i:>{width}}| {lines[i-1]}")
+        i += 1
+    return ''.join(numbered)
 
 
 def insert_line(text: str, line: str, i: int, newline:str='\n') -> str:
@@ -145,7 +201,7 @@ def insert_line(text: str, line: str, i: int, newline:str='\n') -> str:
     i -= 1
 
     #if inserting at the end, and the last line didn't have a line ending, add one
-    if i == len(lines) and not lines[-1].endswith(newline):
+    if i == len(lines) and lines and not lines[-1].endswith(newline):
         lines[-1] += newline
 
     # Insert the new line at the specified position i
@@ -155,11 +211,132 @@ def insert_line(text: str, line: str, i: int, newline:str='\n') -> str:
     return ''.join(lines)
 
 
+def shift_spans(spans:list[tuple[int, int]], old:str, new:str) -> list[tuple[int, int]]:
+    """
+    Map [start, end) line spans of one version of a program onto a later version of it.
+
+    Each span becomes the smallest span covering the new positions of its lines that survived unchanged. Spans with no surviving lines are dropped.
+    """
+    matcher = difflib.SequenceMatcher(None, old.splitlines(), new.splitlines(), autojunk=False)
+    blocks = [(i1, i2, j1 - i1) for tag, i1, i2, j1, _ in matcher.get_opcodes() if tag == 'equal']
+    shifted = []
+    for start, end in spans:
+        # 0-indexed lines of the span that survived, in the new program
+        new_lines = [i + offset for i1, i2, offset in blocks for i in range(max(i1, start-1), min(i2, end-1))]
+        if new_lines:
+            shifted.append((min(new_lines) + 1, max(new_lines) + 2))
+    return shifted
+
+
+def merge_edit(program:str, code:str, start:int, end:int) -> str:
+    """
+    Insert an edit into a program via git merge syntax, so the user can review it
+
+    <<<<<<< Original Code
+    <original code>
+    =======
+    <suggested code>
+    >>>>>>> LLM Suggestion
+    """
+    newline = '\r\n' if '\r\n' in program else '\n' #detect the line ending
+    if len(code) > 0 and not code.endswith(newline): 
+        code += newline # ensure the code ends with a newline
+    new_program = insert_line(program, f"<<<<<<< Original Code{newline}", start, newline)
+    new_program = insert_line(new_program, f"======={newline}", end+1, newline)
+    new_program = insert_line(new_program, f"{code}>>>>>>> LLM Suggestion{newline}", end+2, newline)
+    return new_program
+
+
+def merged_size(program_lines:list[str], edit:Edit) -> tuple[int, int]:
+    """Return the number of lines and bytes an edit occupies in the program once it is wrapped in conflict markers"""
+    original = program_lines[edit['start']-1:edit['end']-1]
+    code_lines = edit['code'].splitlines()
+    n_lines = len(original) + len(code_lines) + 3
+    n_bytes = sum(len(line.encode()) for line in original) + sum(len(line.encode()) + 1 for line in code_lines)
+    n_bytes += len("<<<<<<< Original Code\n=======\n>>>>>>> LLM Suggestion\n")
+    return n_lines, n_bytes
+
+
+def minimize_edits(edits:list[Edit], program:str, min_equal_run:int=3) -> tuple[list[Edit], int, int]:
+    """
+    Trim each edit down to the lines that actually change the program.
+
+    Leading and trailing lines of an edit's code that match the original lines it replaces are always dropped,
+    so they don't get wrapped in conflict markers. The rest of the edit is split into separate hunks across runs of
+    at least `min_equal_run` unchanged lines, but only if that makes the merged edits smaller. Edits that don't change anything are removed.
+
+    Args:
+        edits (list[Edit]): line-range edits against `program`
+        program (str): the current program
+        min_equal_run (int, optional): minimum number of unchanged lines an edit is split across. Defaults to 3.
+
+    Returns:
+        edits: the minimized edits
+        lines_saved: how many fewer lines the minimized edits occupy in the program once merged
+        bytes_saved: how many fewer bytes the minimized edits occupy in the program once merged
+
+    Raises:
+        ValueError: if an edit's line range is not valid for the program
+    """
+    program_lines = program.splitlines(keepends=True)
+    original_lines = program.splitlines()
+    newline = '\r\n' if '\r\n' in program else '\n'
+    minimized, lines_saved, bytes_saved = [], 0, 0
+    for edit in edits:
+        start, end = edit['start'], edit['end']
+        if not 1 <= start <= end <= len(original_lines) + 1:
+            raise ValueError(f"Invalid line range: [{start}, {end}). Must satisfy 1 <= start <= end <= {len(original_lines)+1}")
+        original = original_lines[start-1:end-1]
+        code_lines = edit['code'].splitlines()
+
+        # strip the lines common to the start and end of the original and the suggested code
+        lead = 0
+        while lead < min(len(original), len(code_lines)) and original[lead] == code_lines[lead]:
+            lead += 1
+        trail = 0
+        while trail < min(len(original), len(code_lines)) - lead and original[-trail-1] == code_lines[-trail-1]:
+            trail += 1
+        original = original[lead:len(original)-trail]
+        code_lines = code_lines[lead:len(code_lines)-trail]
+        start += lead
+
+        hunks = []
+        if original or code_lines:
+            hunks = [Edit(code=''.join(f"{line}{newline}" for line in code_lines), start=start, end=start+len(original))]
+
+            # split across long runs of unchanged lines, merging shorter runs into the surrounding hunk
+            spans = []
+            matcher = difflib.SequenceMatcher(None, original, code_lines, autojunk=False)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == 'equal' and i2 - i1 >= min_equal_run:
+                    spans.append(None)
+                elif spans and spans[-1] is not None:
+                    spans[-1] = (spans[-1][0], i2, spans[-1][2], j2)
+                else:
+                    spans.append((i1, i2, j1, j2))
+            split = [
+                Edit(code=''.join(f"{line}{newline}" for line in code_lines[j1:j2]), start=start+i1, end=start+i2)
+                for i1, i2, j1, j2 in filter(None, spans)
+            ]
+            split_lines, split_bytes = map(sum, zip(*[merged_size(program_lines, hunk) for hunk in split]))
+            trimmed_lines, trimmed_bytes = merged_size(program_lines, hunks[0])
+            if len(split) > 1 and split_lines < trimmed_lines and split_bytes < trimmed_bytes:
+                hunks = split
+
+        before_lines, before_bytes = merged_size(program_lines, edit)
+        after = [merged_size(program_lines, hunk) for hunk in hunks]
+        lines_saved += before_lines - sum(n_lines for n_lines, _ in after)
+        bytes_saved += before_bytes - sum(n_bytes for _, n_bytes in after)
+        minimized.extend(hunks)
+
+    return minimized, lines_saved, bytes_saved
+
+
 def get_clean_chat_history(messages:list[Message]) -> list[Message]:
     """
     Filter out any context messages the system inserted into the chat containing the current state of the program.
     """
-    return [message for message in messages if not (message['role'] == Role.system and message['content'].startswith(CONTEXT_PREFIX))]
+    return [message for message in messages if not (message['role'] == Role.system and message['content'].startswith((CONTEXT_PREFIX, UPDATE_CONTEXT_PREFIX)))]
 
 
 
@@ -176,41 +353,87 @@ def sorted_edits(edits:list[Edit]) -> list[Edit]:
 
 
 class ProgramManager:
-    def __init__(self, filename:str):
+    def __init__(self, filename:str, project:'ProjectManager|None'=None):
         self.filename = filename
+        self.project = project
 
-        # if file doesn't exist, create it
+        # if file doesn't exist, create it (along with any missing directories)
         if not os.path.exists(self.filename):
+            os.makedirs(os.path.dirname(self.filename) or '.', exist_ok=True)
             with open(self.filename, 'a') as f: pass 
 
         # save the current state of the program 
         # (start with blank program, so we know to tell LLM if file wasn't blank)
         self.current_program = ''
         self.chat_history_filename = f"{os.path.splitext(self.filename)[0]}.chat" 
+
+        # symbol index of the program, refreshed lazily whenever the file changes
+        self.index = ProgramIndex()
+
+        # [start, end) spans of lines left out of the outline last shown to the LLM, and the program they refer to
+        self.omitted_spans: list[tuple[int, int]] = []
+        self.omitted_program = ''
     
 
     def get_program(self) -> str:
         """Return the current program"""
         with open(self.filename, 'r') as f:
             return f.read()
+
+    def get_index(self) -> ProgramIndex:
+        """Return the symbol index, re-indexing the program only if it changed since the last call"""
+        self.index.update(self.get_program())
+        return self.index
+
+    def set_omitted_spans(self, spans:list[tuple[int, int]], program:str) -> None:
+        """Record the line spans of `program` that were left out of the outline shown to the LLM"""
+        self.omitted_spans, self.omitted_program = list(spans), program
+
+    def get_omitted_spans(self) -> list[tuple[int, int]]:
+        """Return the line spans the LLM hasn't seen, shifted onto the current version of the program"""
+        program = self.get_program()
+        if program != self.omitted_program:
+            self.set_omitted_spans(shift_spans(self.omitted_spans, self.omitted_program, program), program)
+        return self.omitted_spans
+
+    def reveal_lines(self, start:int, end:int) -> None:
+        """Mark the [start, end) lines of the current program as shown to the LLM"""
+        spans = self.get_omitted_spans()
+        self.omitted_spans = [(a, b) for a, b in spans if b <= start or a >= end]
+
+    def resolve_edit(self, edit:Edit|SymbolEdit) -> Edit:
+        """
+        Convert a symbol edit into a line-range edit against the current program. Line-range edits are returned unchanged.
+
+        Raises:
+            ValueError: if the target symbol can't be found, the edit targets a different file,
+                or a line-range edit touches lines that were omitted from the outline shown to the LLM
+        """
+        if 'path' in edit and self.project is None and os.path.normpath(edit['path']) != os.path.normpath(self.filename):
+            raise ValueError(f"Cannot edit '{edit['path']}': editing other files requires --project")
+        if not is_symbol_edit(edit):
+            start, end = edit['start'], edit['end']
+            for a, b in self.get_omitted_spans():
+                if (start < b and end > a) if start < end else a < start < b:
+                    raise ValueError(f"Lines [{start}, {end}) overlap lines {a}-{b-1}, which were omitted from the program you were shown. Use a symbol edit (replace/before/after) instead, or mention the function by name to see its body first")
+            return Edit(code=edit['code'], start=start, end=end)
+        
+        index = self.get_index()
+        if 'replace' in edit:
+            symbol = index.resolve(edit['replace'])
+            return Edit(code=edit['code'], start=symbol['start'], end=symbol['end'])
+        if 'before' in edit:
+            symbol = index.resolve(edit['before'])
+            return Edit(code=edit['code'], start=symbol['start'], end=symbol['start'])
+        symbol = index.resolve(edit['after'])
+        return Edit(code=edit['code'], start=symbol['end'], end=symbol['end'])
     
     def update_program(self, code:str, start:int, end:int) -> None:
         """Update the program"""
         with open(self.filename, 'r') as f:
             program = f.read()
         
-        # insert edits into the program via git merge syntax
-        # <<<<<<< Original Code
-        # <original code>
-        # =======
-        # <suggested code>
-        # >>>>>>> LLM Suggestion
-        newline = '\r\n' if '\r\n' in program else '\n' #detect the line ending
-        if len(code) > 0 and not code.endswith(newline): 
-            code += newline # ensure the code ends with a newline
-        new_program = insert_line(program, f"<<<<<<< Original Code{newline}", start, newline)
-        new_program = insert_line(new_program, f"======={newline}", end+1, newline)
-        new_program = insert_line(new_program, f"{code}>>>>>>> LLM Suggestion{newline}", end+2, newline)
+        new_program = merge_edit(program, code, start, end)
 
         with open(self.filename, 'w') as f:
             f.write(new_program)
@@ -240,6 +463,113 @@ class ProgramManager:
             json.dump(history, f)
 
 
+class ProjectManager:
+    """
+    Manages the python files in a project directory, along with an index of their symbols and imports.
+
+    Paths are relative to the project root.
+    """
+    def __init__(self, root:str):
+        self.root = root
+        self.index = ProjectIndex(root)
+        self.programs: dict[str, ProgramManager] = {}
+
+    def get_manager(self, path:str) -> ProgramManager:
+        """Return the manager of a file in the project (creating the file if it doesn't exist)"""
+        path = os.path.normpath(path)
+        if path not in self.programs:
+            if os.path.isabs(path) or path.split(os.sep)[0] == '..':
+                raise ValueError(f"Path '{path}' is outside of the project")
+            self.programs[path] = ProgramManager(os.path.join(self.root, path), self)
+        return self.programs[path]
+
+    def get_path(self, manager:ProgramManager) -> str:
+        """Return the path of a managed file relative to the project root"""
+        return os.path.normpath(os.path.relpath(manager.filename, self.root))
+
+    def get_index(self) -> ProjectIndex:
+        """Return the project index, re-indexing only the files that changed since the last call"""
+        self.index.refresh()
+        return self.index
+
+    def refresh(self) -> list[str]:
+        """Re-index the files that changed since the index was last refreshed, and return their paths"""
+        return self.index.refresh()
+
+    def apply_edits(self, edits:list[Edit|SymbolEdit], default_path:str) -> tuple[int, int]:
+        """
+        Apply a batch of edits spanning any number of files.
+
+        The batch is atomic: every edit is resolved and merged in memory first, and no file is written unless all of them succeed.
+        Edits are trimmed down to the lines they actually change before being merged (see `minimize_edits`).
+
+        Args:
+            edits (list[Edit|SymbolEdit]): the edits to apply. Edits without a `path` apply to `default_path`
+            default_path (str): the file being worked on, relative to the project root
+
+        Returns:
+            lines_saved: how many fewer lines the edits occupy in the files thanks to trimming
+            bytes_saved: how many fewer bytes the edits occupy in the files thanks to trimming
+
+        Raises:
+            ValueError: if any edit can't be applied. No files are modified in this case
+        """
+        edits_by_path: dict[str, list[Edit|SymbolEdit]] = {}
+        for edit in edits:
+            edits_by_path.setdefault(os.path.normpath(edit.get('path', default_path)), []).append(edit)
+
+        # merge all of the edits in memory, removing any new files on failure
+        created = [path for path in edits_by_path if not os.path.exists(os.path.join(self.root, path))]
+        created_dirs = set()
+        for path in created:
+            parent = os.path.dirname(path)
+            while parent and not os.path.exists(os.path.join(self.root, parent)):
+                created_dirs.add(parent)
+                parent = os.path.dirname(parent)
+        new_programs: dict[str, str] = {}
+        lines_saved, bytes_saved = 0, 0
+        try:
+            for path, file_edits in edits_by_path.items():
+                manager = self.get_manager(path)
+                program = manager.get_program()
+                # line numbers of other files have never been shown to the LLM, so they can only be edited by symbol
+                if path != os.path.normpath(default_path) and program.strip() and not all(is_symbol_edit(edit) for edit in file_edits):
+                    raise ValueError(f"'{path}' is not the current file, so its line numbers are unknown. Use a symbol edit (replace/before/after) instead of start/end")
+                file_edits, file_lines_saved, file_bytes_saved = minimize_edits([manager.resolve_edit(edit) for edit in file_edits], program)
+                lines_saved, bytes_saved = lines_saved + file_lines_saved, bytes_saved + file_bytes_saved
+                for edit in reversed(sorted_edits(file_edits)):
+                    program = merge_edit(program, edit['code'], edit['start'], edit['end'])
+                new_programs[path] = program
+        except Exception as e:
+            for created_path in created:
+                self.programs.pop(created_path, None)
+                if os.path.exists(os.path.join(self.root, created_path)):
+                    os.remove(os.path.join(self.root, created_path))
+            for created_dir in sorted(created_dirs, key=len, reverse=True):
+                if os.path.isdir(os.path.join(self.root, created_dir)) and not os.listdir(os.path.join(self.root, created_dir)):
+                    os.rmdir(os.path.join(self.root, created_dir))
+            raise ValueError(f"{e} (while editing '{path}')") from e
+
+        # write the files, restoring the originals if any write fails
+        originals: dict[str, str] = {}
+        try:
+            for path, program in new_programs.items():
+                manager = self.programs[path]
+                originals[path] = manager.get_program()
+                with open(manager.filename, 'w') as f:
+                    f.write(program)
+        except Exception:
+            for path, original in originals.items():
+                with open(self.programs[path].filename, 'w') as f:
+                    f.write(original)
+            raise
+
+        for path, program in new_programs.items():
+            self.programs[path].current_program = program
+
+        return lines_saved, bytes_saved
+
+
 coder_prompt = '''
 You are a coding assistant. Your job is to help the user write a python program. 
 Whenever you are asked to write code, you may describe your thought process, however ALL CODE MUST BE CONTAINED IN VALID JSON OBJECTS:
@@ -358,6 +688,22 @@ The resulting code will look like this:
 In this example, the entire code block is included, the indentation is correct, and the "start" and "end" values are accurate. The existing spacing is maintained, and only the necessary changes are made.
 
 
+# Symbol edits
+Instead of "start" and "end", an edit may target a whole class or function by its qualified name using exactly one of the keys "replace", "before", or "after":
+```json
+{
+    "code": "def add(*args):\n    return sum(args)\n",
+    "replace": "add"
+}
+```
+- "replace" replaces the entire definition (including its decorators) with your code
+- "before" inserts your code directly above the definition (above its decorators)
+- "after" inserts your code directly below the last line of the definition
+Methods are named with their class, e.g. "ProgramManager.update_program". Prefer symbol edits when rewriting or adding whole functions, since they don't depend on line numbers.
+
+For long programs, the bodies of some functions may be shown as `... # lines 42-55 omitted`. Omitted lines still exist in the program. Never use "start"/"end" values that fall inside an omitted range. If you need to see an omitted function, mention its qualified name (e.g. `ProgramManager.update_program`) in your response without making any edits, and its full body will be shown to you on the next turn.
+
+
 # Instructions
 When providing code modifications, make sure to:
 - Do not include line numbers in your code. The user's code will display line numbers so you know where to insert, but line numbers are not a part of the code itself
@@ -371,21 +717,204 @@ When providing code modifications, make sure to:
 - Use the past tense when talking about changes to code. e.g. "I added a function" instead of "I will add a function"
 '''
 
-def set_current_program_context(manager: ProgramManager, agent: Agent) -> None:
+def is_outlined(program:str, outline_lines:int) -> bool:
+    """Return True if the program is long enough that it should be shown to the LLM as an outline"""
+    return outline_lines > 0 and len(program.splitlines()) > outline_lines
+
+
+def get_program_context(manager: ProgramManager, focus:set[str]|None=None, outline_lines:int=0) -> str:
+    """
+    Build the program context message shown to the LLM
+
+    Args:
+        manager (ProgramManager): the manager of the program to show
+        focus (set[str], optional): qualified names of symbols whose bodies must be shown in full. Defaults to None.
+        outline_lines (int, optional): programs longer than this many lines are shown as an outline, where function bodies not in `focus` are omitted. 0 always shows the full program. Defaults to 0.
+    """
+    program = manager.get_program()
+    omit = None
+    if is_outlined(program, outline_lines):
+        omit = manager.get_index().omitted_spans(focus or set())
+    manager.set_omitted_spans(omit or [], program)
+    lined_program = add_line_numbers(program, omit)
+    if manager.project is None:
+        return f"{CONTEXT_PREFIX}```python\n{lined_program}```"
+
+    # in project mode, also show the other project files, and the signatures of anything this file uses from them
+    path = manager.project.get_path(manager)
+    return f"{CONTEXT_PREFIX}File: {path}\n```python\n{lined_program}```{get_project_context(manager)}"
+
+
+def get_project_context(manager: ProgramManager) -> str:
+    """List the other files in the project, and the signatures of the symbols the managed file uses from them"""
+    project = manager.project
+    path = project.get_path(manager)
+    index = project.get_index()
+    other_paths = sorted(p for p in index.files if p != path)
+    signatures = ''.join(f"# {p}\n{sigs}" for p, sigs in index.referenced_signatures(path).items()) if path in index.files else ''
+    context = ''
+    if other_paths:
+        context += f"\nOther files in the project: {', '.join(other_paths)}"
+    if signatures:
+        context += f"\nSignatures of symbols used from other files in the project:\n```python\n{signatures}```"
+    return context
+
+
+def set_current_program_context(manager: ProgramManager, agent: Agent, focus:set[str]|None=None, outline_lines:int=0) -> None:
     """
     Adds the current program context to the chat history as a timed context
 
     This lets the LLM see the current state of the program so it can make its edits.
     This should be called every time before a user message is sent to the llm
     """
-    lined_program = add_line_numbers(manager.get_program())
-    agent.add_timed_context(f"{CONTEXT_PREFIX}```python\n{lined_program}```")
+    agent.add_timed_context(get_program_context(manager, focus, outline_lines))
+
+
+project_prompt = '''
+
+# Project mode
+The user's program is part of a project with multiple files. The context shows the current file, the other files in the project, and the signatures of the symbols the current file uses from them.
+To edit a different file, add a "path" key with the file's path (relative to the project root) to the edit:
+```json
+{
+    "code": "def divide(a, b):\n    return a / b\n",
+    "after": "multiply",
+    "path": "utils/math.py"
+}
+```
+Edits without a "path" apply to the current file. Edits to any other file must be symbol edits, unless the file is new or empty. A "path" that doesn't exist yet creates a new file.
+All edits in a response are applied together: if any of them fails, none of them are applied.
+'''
+
+
+def get_program_update(old:str, new:str, context_lines:int=2) -> str:
+    """
+    Describe the changes between two versions of a program as hunks of numbered lines from the new version
+
+    Args:
+        old (str): the version of the program the LLM has already seen
+        new (str): the current version of the program
+        context_lines (int, optional): number of unchanged lines to include around each change. Defaults to 2.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    width = len(str(len(new_lines)))
+    hunks = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for group in matcher.get_grouped_opcodes(context_lines):
+        i1, i2, j1, j2 = group[0][1], group[-1][2], group[0][3], group[-1][4]
+        lines = [f"{j+1:>{width}}| {new_lines[j]}" for j in range(j1, j2)]
+        if lines and not lines[-1].endswith('\n'):
+            lines[-1] += '\n'
+        hunks.append(f"@@ old lines [{i1+1}, {i2+1}) are now lines [{j1+1}, {j2+1}) @@\n{''.join(lines)}")
+    return ''.join(hunks)
+
+
+class PinnedProgramContext:
+    """
+    Prefix-stable layout of the program context.
+
+    Rather than replacing the program context every turn, a baseline copy of the program is pinned once,
+    and later changes are appended at the end of the chat as hunks of numbered lines. Everything before the
+    newest messages stays byte-identical across turns, so provider-side prompt caches can reuse the prefix.
+    The baseline is re-pinned (breaking the prefix once) when the appended updates outgrow half of it.
+    """
+    def __init__(self, manager: ProgramManager, outline_lines:int=0):
+        self.manager = manager
+        self.outline_lines = outline_lines
+        self.shown: str|None = None  # version of the program the LLM has seen
+        self.shown_focus: set[str] = set()
+        self.shown_project = ''  # (project mode) other files and signatures the LLM has seen
+        self.update_size = 0  # characters appended since the baseline was pinned
+
+    def pin_baseline(self, agent: Agent, focus:set[str]) -> None:
+        """Remove all program context messages, and pin the current program as the new baseline"""
+        agent.messages = get_clean_chat_history(agent.messages)
+        agent.messages.append(Message(role=Role.system, content=get_program_context(self.manager, focus, self.outline_lines)))
+        self.shown = self.manager.get_program()
+        self.shown_focus = set(focus)
+        self.shown_project = get_project_context(self.manager) if self.manager.project is not None else ''
+        self.update_size = 0
+
+    def update(self, agent: Agent, focus:set[str]|None=None) -> None:
+        """Append any changes to the program (or newly referenced function bodies) since the last turn"""
+        focus = focus or set()
+        if self.shown is None or self.update_size > len(self.shown) // 2:
+            self.pin_baseline(agent, focus)
+            return
+
+        # if the program can't be indexed, omitted bodies can't be revealed by name, so re-pin the full program
+        if self.manager.get_index().error is not None and len(self.manager.get_omitted_spans()) > 0:
+            self.pin_baseline(agent, focus)
+            return
+
+        program = self.manager.get_program()
+        chunks = []
+        if program != self.shown:
+            chunks.append(f"Changed lines (lines outside these hunks are unchanged, but shifted by the lines added/removed above them):\n```python\n{get_program_update(self.shown, program)}```")
+        index = self.manager.get_index()
+        new_focus = (focus - self.shown_focus) & index.symbols.keys()
+        if new_focus and is_outlined(program, self.outline_lines):
+            lines = program.splitlines(keepends=True)
+            width = len(str(len(lines)))
+            bodies = []
+            for name in sorted(new_focus, key=lambda name: index.symbols[name]['start']):
+                symbol = index.symbols[name]
+                self.manager.reveal_lines(symbol['start'], symbol['end'])
+                bodies.extend(f"{j+1:>{width}}| {lines[j]}" for j in range(symbol['start']-1, symbol['end']-1))
+            if not bodies[-1].endswith('\n'):
+                bodies[-1] += '\n'
+            chunks.append(f"Previously omitted lines:\n```python\n{''.join(bodies)}```")
+        project_context = self.shown_project
+        if self.manager.project is not None and len(self.manager.project.refresh()) > 0:
+            project_context = get_project_context(self.manager)
+            if project_context != self.shown_project:
+                chunks.append(f"Other project files changed. Current project context:{project_context or ' (no other files)'}")
+        if not chunks:
+            return
+
+        update = UPDATE_CONTEXT_PREFIX + '\n'.join(chunks)
+        agent.messages.append(Message(role=Role.system, content=update))
+        self.shown = program
+        self.shown_focus |= focus
+        self.shown_project = project_context
+        self.update_size += len(update)
+
+
+class PrefixReuseMeter:
+    """
+    Local stand-in for a provider-side prompt cache.
+
+    Records each request sent to the LLM, and measures how many leading characters it shares with the previous request.
+    """
+    def __init__(self):
+        self.previous = ''
+        self.reused = 0
+        self.total = 0
+
+    def record(self, prompt:str, messages:list[Message]) -> tuple[int, int]:
+        """Record a request. Returns the number of characters matching the previous request's prefix, and the request length"""
+        request = json.dumps([prompt] + [[str(m['role']), m['content']] for m in messages])
+        reused = len(os.path.commonprefix([self.previous, request]))
+        self.previous = request
+        self.reused += reused
+        self.total += len(request)
+        return reused, len(request)
+
+    def reuse_rate(self) -> float:
+        """Fraction of all recorded request characters that matched the previous request's prefix"""
+        return self.reused / self.total if self.total else 0.0
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Coding Assistant')
     parser.add_argument('file_path', help='(optional) name of the code file', nargs='?')
     parser.add_argument('--clear-history', action='store_true', help='clear chat history')
+    parser.add_argument('--project', help='root directory of a multi-file project containing the code file. Lets the AI see signatures from, and edit, other files in the project')
+    parser.add_argument('--stable-prefix', action='store_true', help='pin the program context and only append changes, so the prompt prefix stays identical across turns')
+    parser.add_argument('--prefix-stats', action='store_true', help='print how much of each request matches the previous request prefix')
+    parser.add_argument('--edit-stats', action='store_true', help='print how many lines/bytes were saved by trimming unchanged lines out of the suggested edits')
+    parser.add_argument('--outline-lines', type=int, default=300, help='show programs longer than this many lines as an outline, only including function bodies referenced in the conversation (0 to always show the full program)')
     args = parser.parse_args()
 
     # handle optional file path
@@ -398,15 +927,21 @@ def main():
     args = parse_args()
     file_path = args.file_path
 
-    manager = ProgramManager(file_path)
-    agent = Agent(prompt=coder_prompt, spinner=no_spinner)
+    project = ProjectManager(args.project) if args.project else None
+    manager = project.get_manager(os.path.relpath(file_path, args.project)) if project else ProgramManager(file_path)
+    prompt = coder_prompt + project_prompt if project else coder_prompt
+    agent = Agent(prompt=prompt, spinner=no_spinner)
 
     # Load chat history if it exists
     if not args.clear_history:
         agent.messages = manager.load_chat_history()
 
     # initialize the program context
-    set_current_program_context(manager, agent)
+    pinned_context = PinnedProgramContext(manager, args.outline_lines) if args.stable_prefix else None
+    if pinned_context is None:
+        set_current_program_context(manager, agent, outline_lines=args.outline_lines)
+    shown_focus: set[str] = set()
+    prefix_meter = PrefixReuseMeter()
         
 
     def on_get_chat_history() -> list[ChatMessage]:
@@ -426,13 +961,30 @@ def main():
     def on_chat_message(message:str) -> list[ChatMessage]:
         """Process a user's message and return the AI's response"""
         
-        # if the program changed since the AI edited it, tell the AI
-        if manager.is_program_changed():
+        nonlocal shown_focus
+
+        # symbols mentioned in this message (or by qualified name in the AI's last response) get their bodies shown in outlined programs
+        focus = set()
+        if is_outlined(manager.get_program(), args.outline_lines):
+            last_response = next((m['content'] for m in reversed(agent.messages) if m['role'] == Role.assistant), '')
+            index = manager.get_index()
+            focus = index.find_mentioned(message) | index.find_mentioned(last_response, bare_names=False)
+
+        # if the program changed since the AI edited it (or the AI needs to see more of it), tell the AI
+        if pinned_context is not None:
+            pinned_context.update(agent, focus)
+        elif manager.is_program_changed() or not focus <= shown_focus or (project is not None and len(project.refresh()) > 0):
             # slightly hacky way to clear all program context messages, but keep error context messages
             # TODO: look into archytas having a method for clearing specific types of context messages
             while len(agent._context_lifetimes) > 0:
                 agent.update_timed_context()
-            set_current_program_context(manager, agent)
+            set_current_program_context(manager, agent, focus, args.outline_lines)
+            shown_focus = focus
+
+        # measure how much of the request matches the previous one, as a provider prefix cache would see it
+        reused, total = prefix_meter.record(prompt, agent.messages + [Message(role=Role.user, content=message)])
+        if args.prefix_stats:
+            print(f"Prefix reuse: {reused}/{total} chars ({reused/total:.0%}) this turn, {prefix_meter.reuse_rate():.0%} overall")
 
         # send the user message to the agent, and get the response
         raw_response = agent.query(message)
@@ -448,11 +1000,38 @@ def main():
 
         response.append(ChatMessage(role='AI', content=chat))
 
+        # in project mode, apply the edits (which may span several files) as a single atomic batch
+        lines_saved, bytes_saved = 0, 0
+        if project is not None and len(edits) > 0:
+            try:
+                lines_saved, bytes_saved = project.apply_edits(edits, project.get_path(manager))
+            except Exception as e:
+                msg = f"Error: {e}. None of the edits were applied"
+                response.append(ChatMessage(role='System', content=msg))
+                agent.add_permanent_context(msg)
+            edits = []
+
+        # convert any symbol edits into line-range edits against the current program,
+        # and trim them down to the lines they actually change, so unchanged lines aren't wrapped in conflict markers
+        resolved_edits = []
+        program = manager.get_program()
+        for edit in edits:
+            try:
+                trimmed, edit_lines_saved, edit_bytes_saved = minimize_edits([manager.resolve_edit(edit)], program)
+                resolved_edits.extend(trimmed)
+                lines_saved, bytes_saved = lines_saved + edit_lines_saved, bytes_saved + edit_bytes_saved
+            except Exception as e:
+                msg = f"Error: {e} while handling edit {edit}"
+                response.append(ChatMessage(role='System', content=msg))
+                agent.add_permanent_context(msg)
+        edits = resolved_edits
+
         #sort the edits by start line number
         try:
             edits = reversed(sorted_edits(edits))
         except Exception as e:
             edits, msg = [], f"Error sorting edits: {e}"
+            lines_saved, bytes_saved = 0, 0
             response.append(ChatMessage(role='System', content=msg))
             agent.add_permanent_context(msg)
 
@@ -464,6 +1043,10 @@ def main():
                 msg = f"Error: {e} while handling edit {edit}"
                 response.append(ChatMessage(role='System', content=msg))
                 agent.add_permanent_context(msg)
+
+        # report the savings from trimming, now that the trimmed edits were applied
+        if args.edit_stats:
+            print(f"Edit trimming saved {lines_saved} lines ({bytes_saved} bytes) this turn")
         
         manager.save_chat_history(agent.messages)
 
@@ -0,0 +1,310 @@
+import ast
+import os
+import re
+from typing import Generator, TypedDict
+
+
+class Symbol(TypedDict):
+    name: str        # qualified name, e.g. "ProgramManager.update_program"
+    kind: str        # "class", "def", or "async def"
+    start: int       # first line of the symbol including decorators (1-indexed, inclusive)
+    line: int        # line containing the `class`/`def` keyword
+    end: int         # line after the last line of the symbol (exclusive)
+    body_start: int  # first line of the symbol's body
+
+
+kind_map = {
+    ast.ClassDef: 'class',
+    ast.FunctionDef: 'def',
+    ast.AsyncFunctionDef: 'async def',
+}
+
+
+def iter_symbols(node:ast.AST, prefix:str='') -> Generator[Symbol, None, None]:
+    """
+    Walk the class/function definitions of a parsed program, yielding each with its qualified name and line span.
+
+    Only definitions at module level or nested directly inside other definitions are indexed.
+    """
+    for child in ast.iter_child_nodes(node):
+        if type(child) not in kind_map:
+            continue
+        name = f"{prefix}{child.name}"
+        start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+        yield Symbol(
+            name=name,
+            kind=kind_map[type(child)],
+            start=start,
+            line=child.lineno,
+            end=child.end_lineno + 1,
+            body_start=child.body[0].lineno,
+        )
+        yield from iter_symbols(child, f"{name}.")
+
+
+def iter_imports(tree:ast.AST) -> Generator[tuple[str, str, str|None], None, None]:
+    """
+    Yield (alias, module, name) for every name bound by an import in a parsed program.
+
+    `import a.b as c` yields ('c', 'a.b', None), and `from ..a import b as c` yields ('c', '..a', 'b').
+    Star imports are skipped.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.asname or alias.name, alias.name, None
+        elif isinstance(node, ast.ImportFrom):
+            module = '.' * node.level + (node.module or '')
+            for alias in node.names:
+                if alias.name != '*':
+                    yield alias.asname or alias.name, module, alias.name
+
+
+def strip_conflicts(program:str) -> tuple[str, list[tuple[int, int]]]:
+    """
+    Blank out the conflict markers and suggested code of any unresolved edits in a program, keeping the original code.
+
+    Lines are blanked rather than removed, so line numbers in the result match the original program.
+
+    Returns:
+        program: the program with only the original side of each conflict
+        conflicts: [start, end) line spans of each conflict, from its `<<<<<<<` line to its `>>>>>>>` line
+    """
+    lines = program.splitlines(keepends=True)
+    conflicts = []
+    start, in_suggestion = None, False
+    for i, line in enumerate(lines):
+        if line.startswith('<<<<<<< '):
+            lines[i], start = '\n', i + 1
+        elif line.rstrip() == '=======' and start is not None:
+            lines[i], in_suggestion = '\n', True
+        elif in_suggestion:
+            lines[i] = '\n'
+            if line.startswith('>>>>>>> '):
+                conflicts.append((start, i + 2))
+                start, in_suggestion = None, False
+    return ''.join(lines), conflicts
+
+
+def iter_identifiers(text:str) -> Generator[str, None, None]:
+    """Yield every identifier and dotted name (plus each of its parts) found in a piece of text"""
+    for token in re.findall(r'[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*', text):
+        yield token
+        if '.' in token:
+            yield from token.split('.')
+
+
+class ProgramIndex:
+    """
+    Index mapping the qualified names of classes/functions in a program to their line spans.
+
+    The index is a whole-file cache keyed on the program text: calling `update` with an unchanged program is free,
+    and any change re-parses the whole program. While the program contains unresolved conflict markers from
+    suggested edits, the original side of each conflict is indexed, with line numbers matching the actual file.
+    """
+    def __init__(self):
+        self.source: str|None = None
+        self.indexed_source = ''  # the source that was parsed, i.e. without any conflict markers
+        self.symbols: dict[str, Symbol] = {}
+        self.imports: dict[str, tuple[str, str|None]] = {}  # bound name -> (module, imported name)
+        self.error: SyntaxError|None = None
+
+    def update(self, program:str) -> bool:
+        """Re-index the program if it changed. Returns True if the index was rebuilt"""
+        if program == self.source:
+            return False
+
+        self.source = program
+        conflicts, self.indexed_source = [], program
+        try:
+            tree = ast.parse(program)
+        except SyntaxError as e:
+            # the file may still contain unresolved conflict markers, so try indexing the original code
+            try:
+                self.indexed_source, conflicts = strip_conflicts(program)
+                tree = ast.parse(self.indexed_source)
+            except SyntaxError:
+                self.symbols, self.imports, self.error, self.indexed_source = {}, {}, e, program
+                return True
+
+        self.symbols = {s['name']: s for s in iter_symbols(tree)}
+        # grow symbols that partially cover a conflict to cover all of it, so edits to them replace the markers too
+        for symbol in self.symbols.values():
+            for start, end in conflicts:
+                if start < symbol['end'] and end > symbol['start']:
+                    symbol['start'], symbol['end'] = min(symbol['start'], start), max(symbol['end'], end)
+        self.imports = {alias: (module, name) for alias, module, name in iter_imports(tree)}
+        self.error = None
+        return True
+
+    def resolve(self, name:str) -> Symbol:
+        """
+        Look up a symbol by qualified name, or by its bare name if that is unambiguous.
+
+        Raises:
+            ValueError: if the program can't be parsed, or the name is unknown or ambiguous
+        """
+        if self.error is not None:
+            raise ValueError(f"Cannot locate '{name}': the program failed to parse ({self.error.msg} on line {self.error.lineno})")
+
+        if name in self.symbols:
+            return self.symbols[name]
+
+        matches = [s for qualname, s in self.symbols.items() if qualname.rsplit('.', 1)[-1] == name]
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1:
+            raise ValueError(f"Symbol '{name}' is ambiguous. Use one of: {', '.join(s['name'] for s in matches)}")
+        raise ValueError(f"Symbol '{name}' not found in the program")
+
+    def find_mentioned(self, text:str, bare_names:bool=True) -> set[str]:
+        """
+        Return the qualified names of all symbols referenced in a piece of text.
+
+        If `bare_names` is True, symbols are also matched by their bare name (e.g. `update_program` for
+        `ProgramManager.update_program`), as long as no other symbol in the program shares that name.
+        """
+        identifiers = set(iter_identifiers(text))
+        mentioned = {qualname for qualname in self.symbols if qualname in identifiers}
+        if bare_names:
+            bare = {}
+            for qualname in self.symbols:
+                bare.setdefault(qualname.rsplit('.', 1)[-1], []).append(qualname)
+            mentioned |= {qualnames[0] for name, qualnames in bare.items() if len(qualnames) == 1 and name in identifiers}
+        return mentioned
+
+    def omitted_spans(self, focus:set[str], min_lines:int=3) -> list[tuple[int, int]]:
+        """
+        Return [start, end) line spans of function bodies that can be left out of an outline of the program.
+
+        Bodies of functions in `focus` (or nested inside a focused symbol) are kept, as are class bodies,
+        so that the methods of every class still show up in the outline. Bodies shorter than `min_lines`
+        are kept too, since collapsing them wouldn't save anything.
+        """
+        spans = []
+        for qualname, symbol in self.symbols.items():
+            if symbol['kind'] == 'class' or symbol['end'] - symbol['body_start'] < min_lines:
+                continue
+            parts = qualname.split('.')
+            if any('.'.join(parts[:i]) in focus for i in range(1, len(parts)+1)):
+                continue
+            # skip functions nested inside a body that is already omitted
+            if spans and symbol['start'] < spans[-1][1]:
+                continue
+            spans.append((symbol['body_start'], symbol['end']))
+        return spans
+
+    def signature(self, name:str) -> str:
+        """
+        Return the signature of a symbol (its decorators and `class`/`def` lines) with the body left out.
+        Classes are followed by the signatures of their methods and nested classes.
+        """
+        lines = self.indexed_source.splitlines(keepends=True)
+        signatures = []
+        for qualname, symbol in self.symbols.items():
+            if qualname != name and not qualname.startswith(f"{name}."):
+                continue
+            # only include members reached through classes, e.g. not the methods of a class local to a function
+            parts = qualname.split('.')
+            ancestors = ['.'.join(parts[:i]) for i in range(name.count('.') + 1, len(parts))]
+            if any(self.symbols[ancestor]['kind'] != 'class' for ancestor in ancestors):
+                continue
+            header = lines[symbol['start']-1:max(symbol['body_start']-1, symbol['line'])]
+            signatures.append(''.join(line for line in header if line.strip()).rstrip() + '\n')
+        return ''.join(signatures)
+
+
+def join_module(module:str, name:str) -> str:
+    """Join a (possibly relative) module name and an attribute, e.g. ('..pkg', 'mod') -> '..pkg.mod' and ('.', 'mod') -> '.mod'"""
+    return f"{module}{name}" if module.endswith('.') else f"{module}.{name}"
+
+
+class ProjectIndex:
+    """
+    Index of every python file in a project directory: the symbols each file defines, and the names it imports.
+
+    Each file is keyed on its modification time, so `refresh` only re-reads and re-parses files that changed.
+    Paths are relative to the project root.
+    """
+    ignore_dirs = {'__pycache__', 'venv', 'node_modules', 'build', 'dist'}
+
+    def __init__(self, root:str):
+        self.root = root
+        self.files: dict[str, tuple[float, ProgramIndex]] = {}
+
+    def refresh(self) -> list[str]:
+        """Re-index any files that were added or modified, and drop deleted files. Returns the paths that were added, modified, or deleted"""
+        seen, changed = set(), []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.') and d not in self.ignore_dirs]
+            for filename in filenames:
+                if not filename.endswith('.py'):
+                    continue
+                path = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                seen.add(path)
+                mtime = os.path.getmtime(os.path.join(self.root, path))
+                if path in self.files and self.files[path][0] == mtime:
+                    continue
+                index = self.files[path][1] if path in self.files else ProgramIndex()
+                with open(os.path.join(self.root, path), 'r') as f:
+                    index.update(f.read())
+                self.files[path] = (mtime, index)
+                changed.append(path)
+
+        for path in self.files.keys() - seen:
+            del self.files[path]
+            changed.append(path)
+
+        return changed
+
+    def module_path(self, module:str, importer:str) -> str|None:
+        """
+        Find the project file defining a module, or None if the module isn't part of the project
+
+        Args:
+            module (str): the module name. May be relative (leading dots), in which case it is resolved against `importer`
+            importer (str): path of the file importing the module
+        """
+        level = len(module) - len(module.lstrip('.'))
+        base = ''
+        if level > 0:
+            base = os.path.dirname(importer)
+            for _ in range(level - 1):
+                base = os.path.dirname(base)
+        parts = [p for p in module.lstrip('.').split('.') if p]
+        stem = os.path.join(base, *parts) if parts else base
+        for candidate in (f"{stem}.py", os.path.join(stem, '__init__.py')):
+            candidate = os.path.normpath(candidate)
+            if candidate in self.files:
+                return candidate
+        return None
+
+    def referenced_signatures(self, path:str) -> dict[str, str]:
+        """
+        Return the signatures of symbols from other project files that the file at `path` references through its imports
+
+        Returns:
+            dict[str, str]: mapping from the path of each referenced file to the signatures used from it
+        """
+        index = self.files[path][1]
+        identifiers = set(iter_identifiers(index.source or ''))
+
+        references: dict[str, list[str]] = {}
+        for alias, (module, name) in index.imports.items():
+            # `import module` or `from package import module`: collect the attributes used as `alias.<attr>`
+            module_path = self.module_path(module if name is None else join_module(module, name), path)
+            if module_path is not None:
+                names = {i[len(alias)+1:].split('.')[0] for i in identifiers if i.startswith(f"{alias}.")}
+            elif name is not None:
+                module_path, names = self.module_path(module, path), {name}
+            if module_path is None or module_path == path:
+                continue
+            references.setdefault(module_path, []).extend(sorted(names))
+
+        signatures = {}
+        for module_path, names in sorted(references.items()):
+            other = self.files[module_path][1]
+            found = [other.signature(name) for name in dict.fromkeys(names) if name in other.symbols]
+            if found:
+                signatures[module_path] = ''.join(found)
+        return signatures